@@ -1,15 +1,27 @@
+import functools
 import os
 from openai import OpenAI
 api_key_path = '/Users/stevie/repos/lingo_kit_data/dataframes/v1.1.0/generator/openaiapikey.txt'
-api_key = open(api_key_path).read().strip()
+if os.path.exists(api_key_path):
+    with open(api_key_path) as f:
+        api_key = f.read().strip()
+else:
+    api_key = os.environ['OPENAI_API_KEY']
 client = OpenAI(api_key=api_key)
 
 
+@functools.lru_cache(maxsize=32)
+def load_prompt(prompt_file):
+    # prompt templates don't change during a batch run, so only read each one once
+    with open(prompt_file) as f:
+        return f.read()
+
+
 def generate_csv(part_of_speech, base_term, english_translation, output_path, model='gpt-5-mini', prompt_file=None):
     if prompt_file is None:
         prompt_file = f'/Users/stevie/repos/lingo_kit_data/dataframes/v1.1.0/generator/prompts/{part_of_speech}_prompt_with_sentences.txt'
     assert(os.path.exists(prompt_file)), f"Prompt file {prompt_file} does not exist"
-    prompt = open(prompt_file).read()
+    prompt = load_prompt(prompt_file)
     prompt = prompt.replace(f'[{part_of_speech.upper()}]', base_term).replace('[ENGLISH TRANSLATION]', english_translation)
     
     response = client.responses.create(
@@ -28,7 +40,7 @@ def generate_csv_multi_term(part_of_speech, base_terms, output_path, model='gpt-
         prompt_file = f'/Users/stevie/repos/lingo_kit_data/dataframes/v1.1.0/generator/prompts/multi_term/{part_of_speech}.txt'
     assert(os.path.exists(prompt_file)), f"Prompt file {prompt_file} does not exist"
     base_terms_str = ', '.join(base_terms)
-    prompt = open(prompt_file).read()
+    prompt = load_prompt(prompt_file)
     prompt = prompt.replace(f'[TERMS]', base_terms_str)
     
     response = client.responses.create(
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import argparse
 import csv
+import functools
+import multiprocessing
 import sys
 from pathlib import Path
 
@@ -13,13 +15,19 @@ UNIFIED_HEADER = [
     "notes","example_sentence_italian","example_sentence_english"
 ]
 
+# Value every unified field starts from; map_common copies this template per row
+COMMON_DEFAULTS = {k: "n/a" for k in UNIFIED_HEADER}
+COMMON_DEFAULTS.update({"is_comparative": "false", "is_superlative": "false", "is_compound": "false"})
+
+BOOL_MAP = {
+    "true": "true", "t": "true", "yes": "true", "y": "true", "1": "true",
+    "false": "false", "f": "false", "no": "false", "n": "false", "0": "false",
+}
+
 def normalize_bool(val, default="false"):
     if val is None:
         return default
-    s = str(val).strip().lower()
-    if s in {"true","t","yes","y","1"}: return "true"
-    if s in {"false","f","no","n","0"}: return "false"
-    return default
+    return BOOL_MAP.get(str(val).strip().lower(), default)
 
 def norm_na(val):
     if val is None: return "n/a"
@@ -31,22 +39,26 @@ def pick(d, key, default=""):
     v = d.get(key, "")
     return v.strip() if isinstance(v, str) else ("" if v is None else str(v))
 
+# Minimal header fingerprints for each legacy template, checked in order:
+# (columns that must be present, columns that must be absent, pos)
+POS_FINGERPRINTS = [
+    (frozenset({"mood","tense","is_compound","base_term_italian"}), frozenset(), "verb"),
+    (frozenset({"pronoun_kind","person_number","base_word_italian"}), frozenset(), "pronoun"),
+    (frozenset({"preposition_type","base_word_italian"}), frozenset({"article_type"}), "preposition"),
+    (frozenset({"article_type","base_word_italian"}), frozenset(), "article"),
+    (frozenset({"determiner_type","base_word_italian"}), frozenset(), "determiner"),
+    (frozenset({"conjunction_type","base_word_italian"}), frozenset(), "conjunction"),
+    (frozenset({"is_comparative","is_superlative","base_term_italian"}), frozenset(), "adverb"),
+    (frozenset({"gender","plurality","base_term_italian","article_type","article_italian","added_particle_italian","preposition"}), frozenset(), "noun"),
+    (frozenset({"gender","plurality","base_term_italian"}), frozenset({"article_type"}), "adjective"),
+]
+
+# Input files share a handful of templates, so detect each distinct header set once
+@functools.lru_cache(maxsize=None)
 def detect_pos(header_lower_set):
-    # Minimal header fingerprints for each legacy template
-    H = header_lower_set
-    def has(*cols): return all(c in H for c in cols)
-
-    if has("mood","tense","is_compound","base_term_italian"): return "verb"
-    if has("pronoun_kind","person_number","base_word_italian"): return "pronoun"
-    if has("preposition_type","base_word_italian") and not has("article_type"): return "preposition"
-    if has("article_type","base_word_italian"): return "article"
-    if has("determiner_type","base_word_italian"): return "determiner"
-    if has("conjunction_type","base_word_italian") or has("conjunction_type","base_word_italian","example_sentence_italian"): return "conjunction"
-    if has("is_comparative","is_superlative","base_term_italian"): return "adverb"
-    if has("gender","plurality","base_term_italian") and has("article_type","article_italian","added_particle_italian","preposition"):
-        return "noun"
-    if has("gender","plurality","base_term_italian") and not has("article_type"):
-        return "adjective"
+    for required, forbidden, pos in POS_FINGERPRINTS:
+        if required <= header_lower_set and header_lower_set.isdisjoint(forbidden):
+            return pos
     return None
 
 def base_from_any(row):
@@ -59,7 +71,7 @@ def base_from_any(row):
 
 def map_common(row, part_of_speech):
     # Defaults for all unified fields
-    out = {k: "n/a" for k in UNIFIED_HEADER}
+    out = COMMON_DEFAULTS.copy()
     out["term_italian"] = pick(row, "term_italian") or pick(row, "term")
     out["is_base"] = normalize_bool(row.get("is_base"))
     out["base_lemma_italian"] = base_from_any(row)
@@ -74,22 +86,10 @@ def map_common(row, part_of_speech):
     out["person_number"] = norm_na(row.get("person_number"))
     out["gender"] = norm_na(row.get("gender"))
     out["plurality"] = norm_na(row.get("plurality"))
-    out["mood"] = "n/a"
-    out["tense"] = "n/a"
-    out["is_comparative"] = "false"
-    out["is_superlative"] = "false"
-    out["is_compound"] = "false"
-    out["article_type"] = "n/a"
-    out["article_italian"] = "n/a"
-    out["added_particle_italian"] = "n/a"
-    out["preposition"] = "n/a"
-    out["subtype"] = "n/a"
     return out
 
 def map_row(row, pos):
-    # Normalize keys to lower for robust access while preserving values
-    row = { (k.strip().lower() if isinstance(k,str) else k): (v if v is not None else "") for k,v in row.items() }
-
+    # Keys are already stripped/lowercased by read_csv_with_header
     if pos == "verb":
         out = map_common(row, "verb")
         out["mood"] = norm_na(row.get("mood"))
@@ -148,6 +148,11 @@ def map_row(row, pos):
     # Unknown: pass through minimally with guessed POS
     return map_common(row, norm_na("unknown"))
 
+def to_record(row):
+    # Flatten a mapped row into a tuple in UNIFIED_HEADER order. Boolean fields are
+    # already normalized by map_row; picked text fields may still be empty, so fill n/a
+    return tuple(row[k] or "n/a" for k in UNIFIED_HEADER)
+
 def read_csv_with_header(path: Path):
     with path.open(newline="", encoding="utf-8") as f:
         sniffer = csv.Sniffer()
@@ -158,15 +163,43 @@ def read_csv_with_header(path: Path):
             dialect = sniffer.sniff(sample)
         except csv.Error:
             dialect = csv.excel
-        reader = csv.DictReader(f, dialect=dialect)
-        headers = [h.strip().lower() for h in reader.fieldnames] if reader.fieldnames else []
-        rows = [r for r in reader]
+        reader = csv.reader(f, dialect=dialect)
+        headers = [h.strip().lower() for h in next(reader, [])]
+        # Key rows by the already-normalized headers; skip blank lines like DictReader
+        rows = [dict(zip(headers, r)) for r in reader if r]
     return headers, rows
 
+def process_file(path):
+    # Map one input file. Returns (records, recognized); records is None when the file is skipped
+    headers, rows = read_csv_with_header(path)
+    header_set = frozenset(headers)
+    pos = detect_pos(header_set)
+    recognized = pos is not None
+    if pos is None:
+        # Attempt soft guess: if it has 'conjection' typo schema
+        if "conjection_type" in header_set:
+            pos = "conjunction"
+            # Fix key name in rows
+            for r in rows:
+                if "conjection_type" in r and "conjunction_type" not in r:
+                    r["conjunction_type"] = r.pop("conjection_type")
+        else:
+            # Skip truly unknown file
+            return None, recognized
+
+    return [to_record(map_row(r, pos)) for r in rows], recognized
+
+def positive_int(text):
+    n = int(text)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
+
 def main():
     ap = argparse.ArgumentParser(description="Merge LingoKit CSVs into a unified format.")
     ap.add_argument("input", nargs="+", help="CSV files or directories to scan")
     ap.add_argument("-o","--output", required=True, help="Output CSV path")
+    ap.add_argument("-j","--jobs", type=positive_int, default=None, help="Worker processes (default: CPU count, 1 = no pool)")
     args = ap.parse_args()
 
     files = []
@@ -186,47 +219,26 @@ def main():
     merged = []
     unknown_files = []
 
-    for path in files:
-        headers, rows = read_csv_with_header(path)
-        header_set = set(headers)
-        pos = detect_pos(header_set)
-        if pos is None:
+    # Files are independent, so parse+map them in parallel (results come back in input order)
+    if args.jobs == 1:
+        results = [process_file(path) for path in files]
+    else:
+        with multiprocessing.Pool(args.jobs) as pool:
+            results = pool.map(process_file, files, chunksize=4)
+
+    for path, (records, recognized) in zip(files, results):
+        if not recognized:
             unknown_files.append(path)
-            # Attempt soft guess: if it has 'conjection' typo schema
-            if "conjection_type" in header_set:
-                pos = "conjunction"
-                # Fix key name in rows
-                new_rows = []
-                for r in rows:
-                    nr = {k.lower(): v for k,v in r.items()}
-                    if "conjection_type" in nr and "conjunction_type" not in nr:
-                        nr["conjunction_type"] = nr.pop("conjection_type")
-                    new_rows.append(nr)
-                rows = new_rows
-            else:
-                # Skip truly unknown file
-                continue
-
-        for r in rows:
-            merged.append(map_row(r, pos))
+        if records is not None:
+            merged.extend(records)
 
     # Write unified CSV
     outp = Path(args.output)
     outp.parent.mkdir(parents=True, exist_ok=True)
     with outp.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=UNIFIED_HEADER, extrasaction="ignore")
-        writer.writeheader()
-        for row in merged:
-            # Ensure required boolean defaults
-            row["is_base"] = normalize_bool(row.get("is_base"))
-            row["is_comparative"] = normalize_bool(row.get("is_comparative"))
-            row["is_superlative"] = normalize_bool(row.get("is_superlative"))
-            row["is_compound"] = normalize_bool(row.get("is_compound"))
-            # Fill any missing fields with n/a to be safe
-            for k in UNIFIED_HEADER:
-                if row.get(k, "") == "":
-                    row[k] = "n/a"
-            writer.writerow(row)
+        writer = csv.writer(f)
+        writer.writerow(UNIFIED_HEADER)
+        writer.writerows(merged)
 
     if unknown_files:
         print("Finished with some files skipped (unrecognized schema):", file=sys.stderr)
@@ -1,12 +1,17 @@
 # %%
 import asyncio
+import os
 
 from openai import AsyncOpenAI
 from openai.helpers import LocalAudioPlayer
 
 # %%
 api_key_path = '/Users/stevie/repos/lingo_kit_data/dataframes/v1.1.0/generator/openaiapikey.txt'
-api_key = open(api_key_path).read().strip()
+if os.path.exists(api_key_path):
+    with open(api_key_path) as f:
+        api_key = f.read().strip()
+else:
+    api_key = os.environ['OPENAI_API_KEY']
 openai = AsyncOpenAI(api_key=api_key)
 
 # %%
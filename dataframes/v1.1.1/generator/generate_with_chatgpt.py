@@ -1,15 +1,40 @@
+import hashlib
+import io
 import os
+import shelve
 from openai import OpenAI
 import pandas as pd
 import yaml
 
 
 api_key_path = '/Users/stevie/repos/lingo_kit_data/dataframes/v1.1.1/generator/openaiapikey.txt'
-api_key = open(api_key_path).read().strip()
+if os.path.exists(api_key_path):
+    with open(api_key_path) as f:
+        api_key = f.read().strip()
+else:
+    api_key = os.environ['OPENAI_API_KEY']
 client = OpenAI(api_key=api_key)
 
 
 COST_PATH = '/Users/stevie/repos/lingo_kit_data/dataframes/v1.1.1/generator/cost.yaml'
+RESPONSE_CACHE_PATH = '/Users/stevie/repos/lingo_kit_data/dataframes/v1.1.1/generator/response_cache'
+
+# libyaml's C loader when available, pure-python otherwise
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def load_cost_state():
+    with open(COST_PATH) as f:
+        return yaml.load(f, Loader=YAML_LOADER)
+
+
+def save_cost_state():
+    with open(COST_PATH, 'w') as f:
+        yaml.safe_dump(cost_state, f)
+
+
+# running spend, read once at import and written back after every paid call
+cost_state = load_cost_state()
 
 
 # costs (per million tokens)
@@ -44,59 +69,76 @@ def get_cost(response, model='gpt-5-mini'):
     }
 
 
-def generate_csv(italian_term, model='gpt-5-mini', reasoning_effort='low'):
-    current_cost = yaml.load(open(COST_PATH), Loader=yaml.FullLoader)['total_spent']
+def get_cache_key(prompt, italian_term, model, reasoning_effort):
+    key_str = '|'.join([prompt, model, reasoning_effort, italian_term])
+    return hashlib.sha256(key_str.encode('utf-8')).hexdigest()
+
+
+def generate_csv(italian_term, model='gpt-5-mini', reasoning_effort='low', force_generate=False):
     prompt_file = f'/Users/stevie/repos/lingo_kit_data/dataframes/v1.1.1/generator/prompts/merged_prompt.txt'
 
     assert(os.path.exists(prompt_file)), f"Prompt file {prompt_file} does not exist"
     prompt = open(prompt_file).read()
 
-    response = client.responses.create(
-        model=model,
-        input=[
-            {
-                'role': "developer",
-                'content': prompt,
-            },
-            {
-                'role': "user",
-                'content': f"The italian word is {italian_term}",
+    # reuse the output of an earlier identical request (same prompt, model, effort and term)
+    cache_key = get_cache_key(prompt, italian_term, model, reasoning_effort)
+    with shelve.open(RESPONSE_CACHE_PATH) as cache:
+        output_text = None if force_generate else cache.get(cache_key)
+
+    if output_text is None:
+        response = client.responses.create(
+            model=model,
+            input=[
+                {
+                    'role': "developer",
+                    'content': prompt,
+                },
+                {
+                    'role': "user",
+                    'content': f"The italian word is {italian_term}",
+                },
+            ],
+            reasoning={
+                "effort": reasoning_effort,
             },
-        ],
-        reasoning={
-            "effort": reasoning_effort,
-        },
-    )
+        )
 
-    cost_info = get_cost(response, model=model)
+        cost_info = get_cost(response, model=model)
 
-    current_cost += cost_info['total_cost']
-    yaml.dump({'total_spent': current_cost}, open(COST_PATH, 'w'))
+        cost_state['total_spent'] += cost_info['total_cost']
+        save_cost_state()
 
-    temp_path = 'temp.csv'
+        output_text = response.output_text
+    else:
+        print(f"Using cached response for {italian_term}")
+        response = None
+        cost_info = {
+            'non_cached_input_token_cost': 0.0,
+            'cached_input_token_cost': 0.0,
+            'output_token_cost': 0.0,
+            'total_cost': 0.0
+        }
 
-    with open(temp_path, "w") as file:
-        file.write(response.output_text)
-
-    df = pd.read_csv(temp_path)
+    df = pd.read_csv(io.StringIO(output_text))
 
     assert('part_of_speech' in df.columns), f"Generated CSV must contain 'part_of_speech' column: {df.columns}"
     assert('base_lemma_italian' in df.columns), f"Generated CSV must contain 'base_lemma_italian' column: {df.columns}"
 
-    generate_files = []
+    # only cache output that parsed, so a malformed response is retried next time
+    if response is not None:
+        with shelve.open(RESPONSE_CACHE_PATH) as cache:
+            cache[cache_key] = output_text
 
-    for pos in df['part_of_speech'].unique():
-        pos_df = df[df['part_of_speech'] == pos]
+    generate_files = []
 
-        for base_term in pos_df['base_lemma_italian'].unique():
-            base_df = pos_df[pos_df['base_lemma_italian'] == base_term]
+    for (pos, base_term), base_df in df.groupby(['part_of_speech', 'base_lemma_italian'], sort=False):
+        output_dir = f"/Users/stevie/repos/lingo_kit_data/dataframes/v1.1.1/dataframes/{pos}"
+        os.makedirs(output_dir, exist_ok=True)
 
-            output_path = f"/Users/stevie/repos/lingo_kit_data/dataframes/v1.1.1/dataframes/{pos}/{base_term}.csv"
-            base_df.to_csv(output_path, index=False)
-            generate_files.append(output_path)
-            print(f"Saved {len(pos_df)} rows to {output_path}")
-    
-    os.remove(temp_path)
+        output_path = f"{output_dir}/{base_term}.csv"
+        base_df.to_csv(output_path, index=False)
+        generate_files.append(output_path)
+        print(f"Saved {len(base_df)} rows to {output_path}")
 
 
     return response, generate_files, cost_info
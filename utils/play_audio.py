@@ -4,11 +4,10 @@ import time
 
 def play_audio(file_path):
     mixer.init()
-    mixer.music.load(file_path)
-    mixer.music.play()
-    # wait for music to finish playing
-    while mixer.music.get_busy():
-        time.sleep(0.1)
+    sound = mixer.Sound(file_path)
+    sound.play()
+    # clips are short and fully decoded, so sleep once for their length instead of polling
+    time.sleep(sound.get_length())
 
 
 if __name__ == '__main__':
@@ -1,25 +1,36 @@
 # %%
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import logging
 import os
 
+# %%
+BUCKET = 'steviedale-language-app' # Replace with your S3 bucket name
+
+# most S3 requests kept in flight at once; the client's connection pool is sized to match
+MAX_POOL_CONNECTIONS = 16
+
+# one client shared by every S3 call (boto3 clients are thread-safe, creating them concurrently is not)
+s3_client = boto3.client('s3', config=Config(max_pool_connections=MAX_POOL_CONNECTIONS))
+# uploads are few-KB audio files, parallelised by upload_files' own pool, so skip boto3's per-transfer threads
+TRANSFER_CONFIG = TransferConfig(use_threads=False)
+
 # %%
 def upload_file(file_path):
-    
+
     """Upload a file to an S3 bucket
 
     :param file_path: File to upload
     :return: True if file was uploaded, else False
     """
 
-    bucket = 'steviedale-language-app' # Replace with your S3 bucket name
     object_name = os.path.basename(file_path)
 
-    s3_client = boto3.client('s3')
     try:
-        s3_client.upload_file(file_path, bucket, object_name)
+        s3_client.upload_file(file_path, BUCKET, object_name, Config=TRANSFER_CONFIG)
     except ClientError as e:
         logging.error(e)
         return False
-    return True
\ No newline at end of file
+    return True
@@ -1,14 +1,13 @@
-from google.cloud import texttospeech
+import atexit
 import pandas as pd
 import os
 import time
-# for guid generation
-import uuid
-import numpy as np
 import hashlib
-from pydub import AudioSegment
 import requests
+from requests.adapters import HTTPAdapter
 import base64
+from concurrent.futures import ThreadPoolExecutor
+import weakref
 
 
 API_KEY = open("/Users/stevie/repos/lingo_kit_data/utils/google_cloud_api_key.txt").read().strip()
@@ -17,6 +16,13 @@ SAVE_DIR = '/Users/stevie/repos/lingo_kit_data/data/audio'
 DF_PATH = '/Users/stevie/repos/lingo_kit_data/data/dataframe.csv'
 
 ENDPOINT = f"https://texttospeech.googleapis.com/v1/text:synthesize?key={API_KEY}"
+
+# most TTS requests synthesize_batch keeps in flight; the session pool below is sized to match
+MAX_WORKERS = 16
+
+# one session so TLS connections to the endpoint are reused, with a pool big enough for every worker
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS))
 VOICES = {
     'english': {
         'male': 'en-US-Neural2-D',
@@ -28,13 +34,7 @@ VOICES = {
     }
 }
 
-def ssml_single_word(word, rate, pitch, pause_ms, slash_pause_ms):
-    # Add a period to encourage natural sentence prosody
-    safe = word.strip()
-    safe = safe.replace("/", f'.<break time="{slash_pause_ms}ms"/>')
-    if safe[-1] not in ".!?":
-        safe += "."
-    speach_ssml = f"""
+SSML_TEMPLATE = """
         <speak>
             <break time="{pause_ms}ms"/>
             <prosody rate="{rate}" pitch="{pitch}">
@@ -43,11 +43,21 @@ def ssml_single_word(word, rate, pitch, pause_ms, slash_pause_ms):
             <break time="{pause_ms}ms"/>
         </speak>
     """.strip()
-    print(speach_ssml)
+
+
+def ssml_single_word(word, rate, pitch, pause_ms, slash_pause_ms, verbose=False):
+    # Add a period to encourage natural sentence prosody
+    safe = word.strip()
+    safe = safe.replace("/", f'.<break time="{slash_pause_ms}ms"/>')
+    if safe[-1] not in ".!?":
+        safe += "."
+    speach_ssml = SSML_TEMPLATE.format(rate=rate, pitch=pitch, pause_ms=pause_ms, safe=safe)
+    if verbose:
+        print(speach_ssml)
     return speach_ssml
 
 
-def synthesize_word(word, voice_name, speaking_rate, outfile):
+def synthesize_word(word, voice_name, speaking_rate, outfile, verbose=False):
     # right now, let's only support the following settings
     pitch = None
     pause_ms = 120
@@ -60,7 +70,7 @@ def synthesize_word(word, voice_name, speaking_rate, outfile):
         assert(voice_name in VOICES['italian'].values())
         assert(speaking_rate == 0.7)
 
-    ssml = ssml_single_word(word, rate=speaking_rate, pitch="-1st", pause_ms=pause_ms, slash_pause_ms=500)
+    ssml = ssml_single_word(word, rate=speaking_rate, pitch="-1st", pause_ms=pause_ms, slash_pause_ms=500, verbose=verbose)
 
     # Optional: also set global audioConfig tweaks (mild adjustments)
     audio_cfg = {"audioEncoding": "MP3"}
@@ -75,14 +85,25 @@ def synthesize_word(word, voice_name, speaking_rate, outfile):
         "audioConfig": audio_cfg
     }
 
-    r = requests.post(ENDPOINT, json=payload, timeout=30)
+    r = SESSION.post(ENDPOINT, json=payload, timeout=30)
     r.raise_for_status()
-    audio_b64 = r.json()["audioContent"]
+    # decode before opening the file, so a bad response can't leave an empty mp3 behind
+    audio = base64.b64decode(r.json()["audioContent"])
     with open(outfile, "wb") as f:
-        f.write(base64.b64decode(audio_b64))
+        f.write(audio)
+
+
+def synthesize_and_measure(word, voice_name, speaking_rate, outfile, verbose=False):
+    # returns how long the API call took in seconds, and the length of the new clip in ms
+    t0 = time.perf_counter()
+    synthesize_word(word, voice_name=voice_name, speaking_rate=speaking_rate, outfile=outfile, verbose=verbose)
+    t1 = time.perf_counter()
+    return t1 - t0, get_duration_ms(outfile)
 
 
 def get_duration_ms(path):
+    # pydub is only needed here, and only when new audio is added
+    from pydub import AudioSegment
     # print('getting duration of', path)
     audio = AudioSegment.from_file(path)
     return len(audio)  # duration in milliseconds
@@ -94,6 +115,22 @@ def get_audio_hash(text, voice_name, speaking_rate, pitch):
     return hash_key
 
 
+# weak refs to live TextToSpeech instances, oldest first, so tracking them doesn't keep them alive
+_open_instances = []
+
+
+def _close_open_instances():
+    # one exit handler for every instance; oldest saves first so the newest rows win
+    for ref in list(_open_instances):
+        tts = ref()
+        if tts is not None:
+            tts.close()
+
+
+# runs while pandas is still importable, unlike __del__ at interpreter shutdown
+atexit.register(_close_open_instances)
+
+
 class TextToSpeech:
 
     def __init__(self):
@@ -102,86 +139,169 @@ class TextToSpeech:
             os.makedirs(SAVE_DIR)
 
         if not os.path.exists(DF_PATH):
-            self.df = pd.DataFrame(columns=[
+            df = pd.DataFrame(columns=[
                 'hash', 'text', 'audio_file', 'synthesis_time', 
                 'voice_name', 'speaking_rate', 'pitch', 'duration_ms'
             ])
         else:
-            self.df = pd.read_csv(DF_PATH)
+            df = pd.read_csv(DF_PATH)
+
+        # rows are kept as plain dicts and only turned back into a dataframe when needed
+        self._columns = list(df.columns)
+        self._rows = df.to_dict('records')
+        # hash -> row dict, so lookups don't scan the rows
+        self._by_hash = {}
+        # each hash should appear once; remember any that don't so using them still fails loudly
+        self._duplicate_hashes = set()
+        for row in self._rows:
+            if row['hash'] in self._by_hash:
+                self._duplicate_hashes.add(row['hash'])
+            else:
+                self._by_hash[row['hash']] = row
+        if self._duplicate_hashes:
+            print(f"WARNING: {len(self._duplicate_hashes)} hashes appear more than once in {DF_PATH}")
+        # only write the csv back when rows were added
+        self._dirty = False
 
-    # destructor
-    def __del__(self):
+        self._ref = weakref.ref(self)
+        _open_instances.append(self._ref)
+
+    @property
+    def df(self):
+        return pd.DataFrame.from_records(self._rows, columns=self._columns)
+
+    def close(self):
+        # save pending rows and stop tracking this instance for the exit handler
         self.save()
+        if self._ref in _open_instances:
+            _open_instances.remove(self._ref)
+
+    # destructor; an instance dropped before exit (e.g. tts rebound in a notebook) saves here,
+    # and at shutdown the exit handler has already saved it so this is a no-op
+    def __del__(self):
+        self.close()
 
     def synthesize(self, text, voice_name, speaking_rate, verbose=False, force_generate=False):
+        return self.synthesize_batch(
+            [(text, voice_name, speaking_rate)], verbose=verbose, force_generate=force_generate
+        )[0]
+
+    def synthesize_batch(self, items, verbose=False, force_generate=False, max_workers=MAX_WORKERS):
+        # items is a list of (text, voice_name, speaking_rate); returns one row dict per item, in order
+
         # pitch is no longer supported for configuration
         pitch = 0
 
-        # hash text
-        hash_key = get_audio_hash(text, voice_name, speaking_rate, pitch)
-
-        audio_file = f'{SAVE_DIR}/{hash_key}.mp3'
-
-        # check if text already exists
-        match_df = self.df[self.df['hash'] == hash_key]
-        if not force_generate and len(match_df) > 0:
-            if verbose:
-                print(f"found {hash_key} in dataframe")
-            row = match_df.iloc[0]
-            assert(len(match_df) == 1)
-            assert(row['text'] == text)
-            assert(row['speaking_rate'] == speaking_rate)
-            assert(row['pitch'] == pitch)
-            assert(row['voice_name'] == voice_name)
-            assert(row['hash'] == hash_key)
-            assert(row['audio_file'] == audio_file)
+        # more workers than pooled connections would just open and discard extra connections
+        max_workers = min(max_workers, MAX_WORKERS)
 
-        else:
-            if not force_generate and os.path.exists(audio_file):
-                print(f"WARNING: file {audio_file} exists but not in dataframe, adding to dataframe")
-                # since we don't know the synthesis time, just make it -1
-                synthesis_time = -1
-            else:
+        # hash text
+        hash_keys = [get_audio_hash(text, voice_name, speaking_rate, pitch) for text, voice_name, speaking_rate in items]
+
+        # collect the distinct items that need a new call to the TTS API, and the ones
+        # whose mp3 is already on disk but missing from the dataframe (only need a duration)
+        to_synthesize = {}
+        to_measure = {}
+        for (text, voice_name, speaking_rate), hash_key in zip(items, hash_keys):
+            audio_file = f'{SAVE_DIR}/{hash_key}.mp3'
+            if force_generate or (hash_key not in self._by_hash and not os.path.exists(audio_file)):
+                to_synthesize.setdefault(hash_key, (text, voice_name, speaking_rate, audio_file))
+            elif hash_key not in self._by_hash:
+                to_measure.setdefault(hash_key, audio_file)
+
+        if to_synthesize and verbose:
+            print(f"synthesizing {len(to_synthesize)} items...")
+
+        # if to_synthesize:
+        #     raise Exception(
+        #         "WARNING: about to synthesize new audio, did you add new words? " + 
+        #         "If you have just added new words, this is expeceted, just comment out this raise Exception line")
+
+        # Synthesize speech and read durations; the API calls are network-bound and pydub waits
+        # on ffmpeg, so run them concurrently, everything that touches self stays on this thread
+        synthesis_times = {}
+        durations = {}
+        # a failed request shouldn't lose the clips that did succeed (and were paid for), so record
+        # those first and re-raise the first error once they are stored
+        failed = set()
+        first_error = None
+        if to_synthesize or to_measure:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                synthesize_futures = {
+                    hash_key: executor.submit(synthesize_and_measure, *args, verbose=verbose)
+                    for hash_key, args in to_synthesize.items()
+                }
+                measure_futures = {
+                    hash_key: executor.submit(get_duration_ms, audio_file)
+                    for hash_key, audio_file in to_measure.items()
+                }
+            for hash_key, future in list(synthesize_futures.items()) + list(measure_futures.items()):
+                error = future.exception()
+                if error is not None:
+                    failed.add(hash_key)
+                    first_error = first_error or error
+                elif hash_key in synthesize_futures:
+                    synthesis_times[hash_key], durations[hash_key] = future.result()
+                else:
+                    durations[hash_key] = future.result()
+
+        results = []
+        for (text, voice_name, speaking_rate), hash_key in zip(items, hash_keys):
+            if hash_key in failed:
+                continue
+            audio_file = f'{SAVE_DIR}/{hash_key}.mp3'
+
+            # check if text already exists
+            match = self._by_hash.get(hash_key)
+            if not force_generate and match is not None:
                 if verbose:
-                    print("synthesizing...")
-
-                # raise Exception(
-                #     "WARNING: about to synthesize new audio, did you add new words? " + 
-                #     "If you have just added new words, this is expeceted, just comment out this raise Exception line")
-
-                # Synthesize speech
-                t0 = time.perf_counter()
-                synthesize_word(
-                    text, voice_name=voice_name,
-                    speaking_rate=speaking_rate, outfile=audio_file
-                )
-                t1 = time.perf_counter()
-                synthesis_time = t1 - t0
-
-            duration_ms = get_duration_ms(audio_file)
-
-            # store in dataframe
-            if len(match_df) == 0:
-                self.df.loc[self.df.shape[0]] = [
-                    hash_key, text, audio_file, synthesis_time, voice_name, speaking_rate, pitch, duration_ms
-                ]
-                row = self.df.iloc[-1]
+                    print(f"found {hash_key} in dataframe")
+                row = match
+                assert(hash_key not in self._duplicate_hashes)
+                assert(row['text'] == text)
+                assert(row['speaking_rate'] == speaking_rate)
+                assert(row['pitch'] == pitch)
+                assert(row['voice_name'] == voice_name)
+                assert(row['hash'] == hash_key)
+                assert(row['audio_file'] == audio_file)
+
             else:
-                assert(force_generate)
-                assert(len(match_df) == 1)
-                row = match_df.iloc[0]
-        data = dict(row)
-        # convert np.float to float
-        # convert np.int to int
-        for k, v in data.items():
-            if type(v) is np.float64 or type(v) is np.float32 or type(v) is np.float16:
-                data[k] = float(v)
-            if type(v) is np.int64 or type(v) is np.int32 or type(v) is np.int16:
-                data[k] = int(v)
-        return data
+                if hash_key in synthesis_times:
+                    synthesis_time = synthesis_times[hash_key]
+                else:
+                    print(f"WARNING: file {audio_file} exists but not in dataframe, adding to dataframe")
+                    # since we don't know the synthesis time, just make it -1
+                    synthesis_time = -1
+
+                duration_ms = durations[hash_key]
+
+                # store in dataframe
+                if match is None:
+                    row = {
+                        'hash': hash_key, 'text': text, 'audio_file': audio_file,
+                        'synthesis_time': synthesis_time, 'voice_name': voice_name,
+                        'speaking_rate': speaking_rate, 'pitch': pitch, 'duration_ms': duration_ms
+                    }
+                    self._rows.append(row)
+                    self._by_hash[hash_key] = row
+                    self._dirty = True
+                else:
+                    assert(force_generate)
+                    assert(hash_key not in self._duplicate_hashes)
+                    row = match
+            # rows come from to_dict('records') or are built here, so values are already
+            # plain python types; copy so callers can't modify the cached row
+            results.append(dict(row))
+
+        if first_error is not None:
+            raise first_error
+        return results
 
     def save(self):
+        if not self._dirty:
+            return
         self.df.to_csv(DF_PATH, index=False)
+        self._dirty = False
         print(f"Dataframe saved to {DF_PATH}")
 
 
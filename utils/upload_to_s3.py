@@ -1,46 +1,134 @@
-import boto3
+import atexit
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
 import logging
 import os
-import requests
+import tempfile
+import threading
 import time
+from utils.s3_utils import BUCKET, MAX_POOL_CONNECTIONS, TRANSFER_CONFIG, s3_client
+
+
+# listing the whole bucket takes a while, so the key list is cached on disk for an hour
+S3_CACHE_PATH = os.path.expanduser('~/.cache/lingo_kit/s3_keys.json')
+S3_CACHE_TTL = 60 * 60  # seconds
+# bucket listing is split into key ranges at these characters and run in parallel
+LIST_SPLIT_KEYS = '123456789abcdef'
+
+
+def list_key_range(start_after, last_key):
+    """
+    Lists the keys k in the S3 bucket with start_after < k <= last_key.
+
+    Either bound can be None to leave that side open.
+    """
+    kwargs = {'Bucket': BUCKET}
+    if start_after is not None:
+        kwargs['StartAfter'] = start_after
+
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(**kwargs):
+        # keys come back in sorted order, so stop at the first one past the range
+        for obj in page.get('Contents', []):
+            if last_key is not None and obj['Key'] > last_key:
+                return keys
+            keys.append(obj['Key'])
+    return keys
 
 
 def list_s3_objects():
     """
-    Lists all objects in a specified S3 bucket.
+    Lists all objects in the S3 bucket.
 
     Returns:
-        list: A list of dictionaries, where each dictionary represents an S3 object
-              and contains its key (name), size, and last modified timestamp.
+        set: The keys (names) of all objects in the bucket.
     """
-    bucket_name = 'steviedale-language-app' # Replace with your S3 bucket name
-    s3 = boto3.resource('s3')
-    bucket = s3.Bucket(bucket_name)
-
-    object_list = []
-    for obj in bucket.objects.all():
-        object_list.append(obj.key)
-    return object_list
-already_uploaded = list_s3_objects()
+    # object names are hex hashes, so split the key space at each hex digit and
+    # list the ranges in parallel; together the ranges still cover every key
+    bounds = [None] + list(LIST_SPLIT_KEYS) + [None]
+    key_ranges = list(zip(bounds[:-1], bounds[1:]))
+    # one paginator per range, but never more than the shared client has connections
+    with ThreadPoolExecutor(max_workers=min(len(key_ranges), MAX_POOL_CONNECTIONS)) as executor:
+        shards = executor.map(lambda key_range: list_key_range(*key_range), key_ranges)
+        return set(itertools.chain.from_iterable(shards))
+
+
+def save_s3_cache():
+    """Write already_uploaded to the on-disk cache."""
+    global s3_cache_dirty
+    # hold the lock so uploads on other threads can't change the set mid-sort, and two saves can't
+    # swap in their files out of order
+    with s3_cache_lock:
+        os.makedirs(os.path.dirname(S3_CACHE_PATH), exist_ok=True)
+        # write a temp file and swap it in, so a concurrent import never reads half-written json
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(S3_CACHE_PATH), suffix='.tmp', delete=False) as f:
+            json.dump(sorted(already_uploaded), f)
+        # the mtime is what the TTL checks, so keep it at the time of the last full listing
+        os.utime(f.name, (s3_cache_listed_at, s3_cache_listed_at))
+        os.replace(f.name, S3_CACHE_PATH)
+        s3_cache_dirty = False
+
+
+def refresh_s3_cache():
+    """Re-list the bucket, rewrite the on-disk cache and update already_uploaded in place."""
+    global s3_cache_listed_at
+    object_keys = list_s3_objects()
+    s3_cache_listed_at = time.time()
+    with s3_cache_lock:
+        already_uploaded.clear()
+        already_uploaded.update(object_keys)
+    save_s3_cache()
+
+
+def load_s3_cache():
+    """Fill already_uploaded from the on-disk cache, re-listing the bucket if it is missing or stale."""
+    global s3_cache_listed_at
+    if os.path.exists(S3_CACHE_PATH) and time.time() - os.path.getmtime(S3_CACHE_PATH) < S3_CACHE_TTL:
+        s3_cache_listed_at = os.path.getmtime(S3_CACHE_PATH)
+        with open(S3_CACHE_PATH) as f:
+            already_uploaded.update(json.load(f))
+    else:
+        refresh_s3_cache()
+
+
+already_uploaded = set()
+s3_cache_listed_at = None
+# set when an upload isn't on disk yet; guarded, along with already_uploaded, by s3_cache_lock
+s3_cache_dirty = False
+s3_cache_lock = threading.Lock()
+load_s3_cache()
 print(f"loaded names of {len(already_uploaded)} files that have already been uploaded to s3")
 
 
-def upload_file(file_path, verbose=False):
+def flush_s3_cache():
+    """Write the on-disk cache if uploads were added since it was last saved."""
+    if s3_cache_dirty:
+        save_s3_cache()
+
+
+# single uploads don't rewrite the whole cache each time, so write whatever is pending at exit
+atexit.register(flush_s3_cache)
+
+
+def upload_file(file_path, verbose=False, save_cache=False):
     
     """Upload a file to an S3 bucket
 
     :param file_path: File to upload
+    :param save_cache: Write the on-disk key cache now, rather than at exit
     :return: True if file was uploaded, else False
     """
 
-    bucket = 'steviedale-language-app' # Replace with your S3 bucket name
+    global s3_cache_dirty
     object_name = os.path.basename(file_path)
 
     # if file has already been uploaded, don't upload
     if object_name in already_uploaded:
         if verbose:
-            print(f"file {object_name} already exists in bucket {bucket}, skipping upload")
+            print(f"file {object_name} already exists in bucket {BUCKET}, skipping upload")
         return True
 
     # raise Exception(
@@ -49,10 +137,40 @@ def upload_file(file_path, verbose=False):
 
     if verbose:
         print('uploading to s3...')
-    s3_client = boto3.client('s3')
     try:
-        s3_client.upload_file(file_path, bucket, object_name)
+        s3_client.upload_file(file_path, BUCKET, object_name, Config=TRANSFER_CONFIG)
     except ClientError as e:
         logging.error(e)
         return False
-    return True
\ No newline at end of file
+    with s3_cache_lock:
+        already_uploaded.add(object_name)
+        s3_cache_dirty = True
+    if save_cache:
+        save_s3_cache()
+    return True
+
+
+def upload_files(file_paths, max_workers=MAX_POOL_CONNECTIONS, verbose=False):
+
+    """Upload several files to an S3 bucket concurrently
+
+    :param file_paths: Files to upload
+    :param max_workers: Number of uploads in flight at once
+    :return: List of upload_file results, in the same order as file_paths
+    """
+
+    # skip the pool entirely when everything is already in the bucket
+    if all(os.path.basename(p) in already_uploaded for p in file_paths):
+        if verbose:
+            print(f"all {len(file_paths)} files already exist in bucket {BUCKET}, skipping upload")
+        return [True] * len(file_paths)
+
+    # more threads than the client has connections would just queue for (or churn) connections
+    max_workers = min(max_workers, MAX_POOL_CONNECTIONS)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda p: upload_file(p, verbose=verbose, save_cache=False), file_paths))
+    finally:
+        # record the whole batch in the on-disk cache once, rather than after every file,
+        # and even if one upload raised, so the ones that succeeded are still cached
+        flush_s3_cache()
\ No newline at end of file